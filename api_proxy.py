@@ -186,9 +186,12 @@ def fetch_details_for_ids(relevant_ids: List[str]) -> List[Dict]:
         conn = get_db_connection(DB_SCHEMAS[plat]['db'])
         if not conn: continue
         try:
-            placeholders = ','.join(['?'] * len(ids))
-            q = f"SELECT * FROM {DB_SCHEMAS[plat]['table']} WHERE {DB_SCHEMAS[plat]['id_col_db']} IN ({placeholders})"
-            cursor = conn.execute(q, tuple(ids))
+            # Stage the IDs in a temp table and join on it: an LLM-picked ID list has no upper
+            # bound, and one placeholder per ID can exceed SQLite's bound-variable limit
+            conn.execute("CREATE TEMP TABLE requested_ids (id PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO requested_ids VALUES (?)", [(i,) for i in ids])
+            q = f"SELECT t.* FROM {DB_SCHEMAS[plat]['table']} t JOIN requested_ids r ON t.{DB_SCHEMAS[plat]['id_col_db']} = r.id"
+            cursor = conn.execute(q)
             for row in cursor:
                 formatted = format_row(plat, dict(row), conn)
                 if formatted: results.append(formatted)
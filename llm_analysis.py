@@ -15,7 +15,7 @@ except ImportError:
     MODEL_NAME = "xiaomi/mimo-v2-flash"
     HTTP_REFERER = "https://github.com/my-economist-report-app"
 
-INPUT_JSON_FILE = os.path.join(DATA_DIR, "curated_data_for_llm.json") 
+INPUT_JSONL_FILE = os.path.join(DATA_DIR, "curated_data_for_llm.jsonl") 
 LLM_TEXT_OUTPUT = os.path.join(DATA_DIR, "llm_analysis_output.txt")
 
 def process_data_with_llm(json_data):
@@ -76,9 +76,10 @@ def process_data_with_llm(json_data):
     return "Error: LLM Request Failed."
 
 def main():
-    if not os.path.exists(INPUT_JSON_FILE): return
-    with open(INPUT_JSON_FILE, 'r', encoding='utf-8') as f:
-        json_data = f.read()
+    if not os.path.exists(INPUT_JSONL_FILE): return
+    with open(INPUT_JSONL_FILE, 'r', encoding='utf-8') as f:
+        # One JSON object per line; the records go to the model as JSON Lines
+        json_data = "".join(line for line in f if line.strip())
     analysis = process_data_with_llm(json_data)
     with open(LLM_TEXT_OUTPUT, 'w', encoding='utf-8') as out_f:
         out_f.write(analysis)
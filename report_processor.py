@@ -1,18 +1,21 @@
 import re
-import json
 import sqlite3
 import datetime
+import logging
 import os
-from typing import List, Dict, Optional, Any
+import orjson
+from typing import Callable, List, Dict, Optional, Any
 
 DATA_BASE_DIR = os.environ.get("PERSISTENT_STORAGE_PATH", "data")
 INPUT_FILE_PATH = os.path.join(DATA_BASE_DIR, "llm_analysis_output.txt") 
 OUTPUT_FILENAME = os.path.join(DATA_BASE_DIR, "report_with_sources.json")
 
+log = logging.getLogger(__name__)
+
 DB_CONFIG = {
-    "R": {"db_path": os.path.join(DATA_BASE_DIR, "reddit_data.db"), "platform_name": "Reddit"},
-    "YT": {"db_path": os.path.join(DATA_BASE_DIR, "youtube_comments.db"), "platform_name": "Youtube"},
-    "AS": {"db_path": os.path.join(DATA_BASE_DIR, "app_reviews.db"), "platform_name": "App Store"},
+    "R": {"db_path": os.path.join(DATA_BASE_DIR, "reddit_data.db"), "platform_name": "Reddit", "table": "reddit_comments", "id_col": "comment_id"},
+    "YT": {"db_path": os.path.join(DATA_BASE_DIR, "youtube_comments.db"), "platform_name": "Youtube", "table": "youtube_comments", "id_col": "comment_id"},
+    "AS": {"db_path": os.path.join(DATA_BASE_DIR, "app_reviews.db"), "platform_name": "App Store", "table": "economist_reviews", "id_col": "Review ID"},
     "GP": {"db_path": os.path.join(DATA_BASE_DIR, "google_play_reviews.db"), "platform_name": "Google Play", "table": "google_play_reviews", "id_col": "review_id", "text_col": "review_text", "url_col": "url", "date_col": "review_date"},
 }
 
@@ -20,47 +23,79 @@ def get_db_connection(db_path: str) -> Optional[sqlite3.Connection]:
     if not os.path.exists(db_path): return None
     try:
         conn = sqlite3.connect(db_path); conn.row_factory = sqlite3.Row; return conn
-    except: return None
+    except sqlite3.Error as e:
+        log.warning("Could not open %s: %s", db_path, e)
+        return None
+
+def ensure_citation_indexes():
+    """Indexes each citation ID column that is not already covered by a PRIMARY KEY."""
+    for config in DB_CONFIG.values():
+        conn = get_db_connection(config["db_path"])
+        if not conn: continue
+        try:
+            columns = {row["name"]: row["pk"] for row in conn.execute(f'PRAGMA table_info("{config["table"]}")')}
+            if columns and not columns.get(config["id_col"]):
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{config["table"]}_id" ON "{config["table"]}" ("{config["id_col"]}")')
+                conn.commit()
+        except sqlite3.Error as e:
+            log.warning("Could not index %s.%s: %s", config["table"], config["id_col"], e)
+        finally: conn.close()
+
+_GP = DB_CONFIG["GP"]
+_REDDIT_SQL = "SELECT body AS comment_text, created_utc AS date, 'https://reddit.com/comments/' || post_id || '/_/' || comment_id AS comment_url FROM reddit_comments WHERE comment_id = ?"
+_YOUTUBE_SQL = "SELECT text_display AS comment_text, published_at AS date, 'https://youtube.com/watch?v=' || video_id AS comment_url FROM youtube_comments WHERE comment_id = ?"
+_APP_STORE_SQL = 'SELECT "Review Text" AS comment_text, "Review Date" AS date, "Review URL" AS comment_url FROM economist_reviews WHERE "Review ID" = ?'
+_GOOGLE_PLAY_SQL = f"SELECT {_GP['text_col']} AS comment_text, {_GP['date_col']} AS date, {_GP['url_col']} AS comment_url FROM {_GP['table']} WHERE {_GP['id_col']} = ?"
+
+def _fetch_reddit(conn: sqlite3.Connection, citation_id: str) -> Optional[sqlite3.Row]:
+    return conn.execute(_REDDIT_SQL, (citation_id.split(":")[-1],)).fetchone()
+
+def _fetch_youtube(conn: sqlite3.Connection, citation_id: str) -> Optional[sqlite3.Row]:
+    return conn.execute(_YOUTUBE_SQL, (citation_id.split("_", 1)[1],)).fetchone()
+
+def _fetch_app_store(conn: sqlite3.Connection, citation_id: str) -> Optional[sqlite3.Row]:
+    return conn.execute(_APP_STORE_SQL, (citation_id.split("_")[-1],)).fetchone()
+
+def _fetch_google_play(conn: sqlite3.Connection, citation_id: str) -> Optional[sqlite3.Row]:
+    return conn.execute(_GOOGLE_PLAY_SQL, (citation_id.split("_", 1)[1],)).fetchone()
+
+# Citation prefix -> row lookup; resolved once per citation instead of an if/elif cascade.
+PLATFORM_HANDLERS: Dict[str, Callable[[sqlite3.Connection, str], Optional[sqlite3.Row]]] = {
+    "R": _fetch_reddit,
+    "YT": _fetch_youtube,
+    "AS": _fetch_app_store,
+    "GP": _fetch_google_play,
+}
+
+def _fallback_citation(citation_id: str, platform_name: str, text: str = "Not found") -> Dict[str, Any]:
+    return {"id": citation_id, "comment_text": text, "comment_url": "#", "source_platform": platform_name, "date": "Recent"}
 
 def fetch_citation_details(citation_id: str) -> Dict[str, Any]:
-    prefix_match = re.match(r"(R|YT|AS|GP)_", citation_id)
-    if not prefix_match: 
-        return {"id": citation_id, "comment_text": "Not found", "comment_url": "#", "source_platform": "Unknown", "date": "Recent"}
+    platform_key = citation_id.split("_", 1)[0]
+    handler = PLATFORM_HANDLERS.get(platform_key) if "_" in citation_id else None
+    if not handler: 
+        return _fallback_citation(citation_id, "Unknown")
     
-    platform_key = prefix_match.group(1)
-    config = DB_CONFIG.get(platform_key)
+    config = DB_CONFIG[platform_key]
     conn = get_db_connection(config["db_path"])
     
     # PROCESSOR CHANGE 1: Return generic info with platform name if DB is missing
     if not conn: 
-        return {"id": citation_id, "comment_text": "DB missing", "comment_url": "#", "source_platform": config['platform_name'], "date": "Recent"}
-    
-    sql_query = ""
-    db_id_part = citation_id.split("_", 1)[1] if "_" in citation_id else citation_id
-    
-    if platform_key == "R":
-        db_id = citation_id.split(":")[-1]
-        sql_query = f"SELECT body AS comment_text, created_utc AS date, 'https://reddit.com/comments/' || post_id || '/_/' || comment_id AS comment_url FROM reddit_comments WHERE comment_id = '{db_id}'"
-    elif platform_key == "YT":
-        sql_query = f"SELECT text_display AS comment_text, published_at AS date, 'https://youtube.com/watch?v=' || video_id AS comment_url FROM youtube_comments WHERE comment_id = '{db_id_part}'"
-    elif platform_key == "AS":
-        sql_query = f'SELECT "Review Text" AS comment_text, "Review Date" AS date, "Review URL" AS comment_url FROM economist_reviews WHERE "Review ID" = {db_id_part.split("_")[-1]}'
-    elif platform_key == "GP":
-        sql_query = f"SELECT {config['text_col']} AS comment_text, {config['date_col']} AS date, {config['url_col']} AS comment_url FROM {config['table']} WHERE {config['id_col']} = '{db_id_part}'"
+        return _fallback_citation(citation_id, config['platform_name'], "DB missing")
 
     try:
-        cursor = conn.execute(sql_query); row = cursor.fetchone()
+        row = handler(conn, citation_id)
         if row:
             result = dict(row)
             raw_date = result.get('date')
             formatted_date = "Recent"
             try:
-                # Robust Unix timestamp conversion
-                if isinstance(raw_date, (int, float)) or (isinstance(raw_date, str) and raw_date.replace('.','',1).isdigit()):
-                    formatted_date = datetime.datetime.fromtimestamp(float(raw_date)).strftime('%Y-%m-%d')
-                else:
-                    formatted_date = str(raw_date).split(' ')[0]
-            except: formatted_date = "Recent"
+                # Unix timestamps (Reddit) come back from SQLite as numbers; everything else is an ISO-style string
+                if isinstance(raw_date, (int, float)):
+                    formatted_date = datetime.date.fromtimestamp(raw_date).isoformat()
+                elif isinstance(raw_date, str) and raw_date:
+                    formatted_date = raw_date[:10]
+            except (ValueError, OverflowError, OSError): formatted_date = "Recent"
             
             return {
                 "id": citation_id, 
@@ -69,42 +104,58 @@ def fetch_citation_details(citation_id: str) -> Dict[str, Any]:
                 "source_platform": config['platform_name'], 
                 "date": formatted_date
             }
-    except: pass
+    except sqlite3.Error as e:
+        log.debug("Lookup failed for %s: %s", citation_id, e)
     finally: conn.close()
     
     # PROCESSOR CHANGE 2: Return fallback with platform name to prevent "undefined" on dashboard
-    return {"id": citation_id, "comment_text": "Not found", "comment_url": "#", "source_platform": config['platform_name'], "date": "Recent"}
-
-def parse_report(raw_text):
-    paragraphs = [p.strip() for p in raw_text.split('\n\n') if p.strip()]
-    parsed = []
-    for p in paragraphs:
-        citation_matches = re.findall(r"\[\[(.*?)\]\]", p)
-        ids = []
-        for match in citation_matches: ids.extend([cid.strip() for cid in match.split(',')])
-        clean_text = re.sub(r"\[\[.*?\]\]", "", p).strip()
-        
-        if ":" in clean_text[:25]:
-            topic_part, insight_part = clean_text.split(":", 1)
-            topic = topic_part.strip().upper()
-            insight = insight_part.strip()
-        else:
-            topic = "GENERAL"; insight = clean_text
-
-        parsed.append({
-            "topic": topic,
-            "insight": insight,
-            "citations": [fetch_citation_details(cid) for cid in sorted(list(set(ids)))],
-            "count": len(set(ids))
-        })
-    return parsed
+    return _fallback_citation(citation_id, config['platform_name'])
+
+def _paragraphs(f):
+    """Yields blank-line separated paragraphs from a file without reading it whole."""
+    buf = []
+    for line in f:
+        if line.strip():
+            buf.append(line)
+        elif buf:
+            yield "".join(buf).strip()
+            buf.clear()
+    if buf:
+        yield "".join(buf).strip()
+
+def parse_paragraph(p: str) -> Optional[Dict[str, Any]]:
+    citation_matches = re.findall(r"\[\[(.*?)\]\]", p)
+    ids = []
+    for match in citation_matches: ids.extend([cid.strip() for cid in match.split(',')])
+    clean_text = re.sub(r"\[\[.*?\]\]", "", p).strip()
+    if not clean_text and not ids: return None
+
+    if ":" in clean_text[:25]:
+        topic_part, insight_part = clean_text.split(":", 1)
+        topic = topic_part.strip().upper()
+        insight = insight_part.strip()
+    else:
+        topic = "GENERAL"; insight = clean_text
+
+    # Keep the order in which the LLM cited sources.
+    unique_ids = dict.fromkeys(ids)
+    return {
+        "topic": topic,
+        "insight": insight,
+        "citations": [fetch_citation_details(cid) for cid in unique_ids],
+        "count": len(unique_ids)
+    }
 
 def main():
     if not os.path.exists(INPUT_FILE_PATH): return
+    ensure_citation_indexes()
+    data = []
     with open(INPUT_FILE_PATH, 'r', encoding='utf-8') as f:
-        data = parse_report(f.read())
-    with open(OUTPUT_FILENAME, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+        for p in _paragraphs(f):
+            item = parse_paragraph(p)
+            if item: data.append(item)
+    with open(OUTPUT_FILENAME, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,55 +1,146 @@
+import contextlib
+import io
 import os
 import subprocess
 import threading
 import time
 import sys
 import logging
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Set up logging for the master script
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(stage)s%(message)s')
+
+class StagePrefix(logging.Filter):
+    """Tags every log record with the pipeline step running in this process.
+
+    Steps share the terminal while the scrapers run concurrently; the prefix keeps
+    their output attributable, as it was when each step ran as its own script.
+    """
+    stage = None
+
+    def filter(self, record):
+        record.stage = f"[{self.stage}] " if self.stage else ""
+        return True
+
+STAGE_PREFIX = StagePrefix()
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(STAGE_PREFIX)
+
+class StageOutput(io.TextIOBase):
+    """stdout/stderr stand-in that logs a step's print() output line by line.
+
+    Locked because steps such as the YouTube scraper print from worker threads.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.pending += text
+            *lines, self.pending = self.pending.split("\n")
+        for line in lines:
+            logging.info(line.rstrip())
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            line, self.pending = self.pending, ""
+        if line:
+            logging.info(line.rstrip())
 
 # --- CONFIGURATION ---
-# Define the order of execution for your pipeline scripts
-PIPELINE_SCRIPTS = [
-    # 1. Scraping (Update Databases)
-    "scrapers/get_app_store_data.py", 
-    "scrapers/get_reddit_data.py",
-    "scrapers/get_youtube_data.py",
+# Pipeline steps are importable modules exposing main(); they run inside a shared
+# worker pool instead of a fresh interpreter per step.
+# 1. Scraping (Update Databases) - the sources are independent, so they run concurrently
+PARALLEL_STAGE = [
+    "scrapers.get_app_store_data", 
+    "scrapers.get_reddit_data",
+    "scrapers.get_youtube_data",
     # ADDED: Google Play Scraper
-    "scrapers/get_google_play_data.py", 
-    
-    # 2. Curation (Create curated_data_for_llm.json)
-    "scrapers/get_top_comments.py",
+    "scrapers.get_google_play_data", 
+]
+
+# Steps that depend on the scraped databases, executed in order
+SERIAL_STAGES = [
+    # 2. Curation (Create curated_data_for_llm.jsonl)
+    "scrapers.get_top_comments",
     
     # 3. Analysis (Create llm_analysis_output.txt)
-    "llm_analysis.py",
+    "llm_analysis",
     
     # 4. Processing (Create report_with_sources.json)
-    "report_processor.py",
+    "report_processor",
 ]
 
 BACKEND_SCRIPT = "api_proxy.py"
+
+# Scraper result cache: a scraper that succeeded within the TTL is skipped (0 disables it)
+DATA_DIR = os.environ.get("PERSISTENT_STORAGE_PATH", "data")
+SCRAPE_CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+SCRAPE_CACHE_TTL_HOURS = float(os.environ.get("SCRAPE_CACHE_TTL_HOURS", 6))
 # ---------------------
 
-def run_script(script_path):
-    """Executes a single Python script and handles errors."""
-    logging.info(f"🚀 Starting step: {script_path}")
-    
-    # Use python3 if python command fails, which is common on macOS
-    command = [sys.executable, script_path]
-    
+# run_stage outcomes. Only a crash halts the pipeline; an incomplete step (main() returned
+# False, e.g. missing credentials or a fetch abandoned after retries) lets the run go on.
+COMPLETE, INCOMPLETE, CRASHED = "complete", "incomplete", "crashed"
+
+def run_stage(module_name):
+    """Imports a pipeline module and runs its main() in the current (worker) process.
+
+    The step's print() output and log records are prefixed with its module name.
+    Returns CRASHED when the step raised or called sys.exit() with a non-zero code,
+    INCOMPLETE when its main() returned False, and COMPLETE otherwise.
+    """
+    logging.info(f"🚀 Starting step: {module_name}")
+    STAGE_PREFIX.stage = module_name
+    output = StageOutput()
     try:
-        # Check=True raises an exception for non-zero exit codes (script failure)
-        subprocess.run(command, check=True, text=True, capture_output=True)
-        logging.info(f"✅ Success: {script_path}")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ FAILED: {script_path} exited with error code {e.returncode}")
-        logging.error(f"--- Stdout ---\n{e.stdout}")
-        logging.error(f"--- Stderr ---\n{e.stderr}")
-        return False
-    except FileNotFoundError:
-        logging.error(f"❌ FAILED: Script not found at {script_path}. Check your path.")
-        return False
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            module = importlib.import_module(module_name)
+            result = COMPLETE if module.main() is not False else INCOMPLETE
+    except SystemExit as e:
+        # Steps signal fatal errors with sys.exit(1), as they did when run as scripts
+        result = COMPLETE if e.code in (None, 0) else CRASHED
+    except Exception:
+        logging.exception(f"❌ FAILED: {module_name} raised an error")
+        return CRASHED
+    finally:
+        output.flush()
+        STAGE_PREFIX.stage = None
+    if result == CRASHED:
+        logging.error(f"❌ FAILED: {module_name} exited with an error")
+    elif result == INCOMPLETE:
+        logging.warning(f"⚠️ Incomplete: {module_name} reported a partial run; continuing with the data stored so far.")
+    else:
+        logging.info(f"✅ Success: {module_name}")
+    return result
+
+def run_scraper_cached(module_name):
+    """Runs a scraper unless its last successful run is younger than the cache TTL.
+
+    Only a COMPLETE run is stamped; partial scrapes (quota stops, fetches abandoned
+    after retries, missing credentials) run again next time. Returns False on a crash.
+    """
+    stamp_path = os.path.join(SCRAPE_CACHE_DIR, f"{module_name}.stamp")
+    if SCRAPE_CACHE_TTL_HOURS > 0 and os.path.exists(stamp_path):
+        age_hours = (time.time() - os.path.getmtime(stamp_path)) / 3600
+        if age_hours < SCRAPE_CACHE_TTL_HOURS:
+            logging.info(f"♻️ Cache hit: {module_name} last succeeded {age_hours:.1f}h ago, skipping.")
+            return True
+
+    result = run_stage(module_name)
+    if result != COMPLETE:
+        # Never let an older stamp stand in for a failed run, e.g. after the TTL is raised
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(stamp_path)
+        return result != CRASHED
+    os.makedirs(SCRAPE_CACHE_DIR, exist_ok=True)
+    with open(stamp_path, 'w') as f:
+        f.write(time.strftime('%Y-%m-%d %H:%M:%S'))
     return True
 
 def start_backend():
@@ -73,14 +164,21 @@ def start_backend():
     return flask_thread
 
 def main():
-    """Orchestrates the sequential pipeline execution and starts the backend."""
+    """Orchestrates the pipeline execution and starts the backend."""
     
-    # 1. Execute sequential pipeline
+    # 1. Execute the pipeline: scrapers in parallel, then the dependent steps in order
     logging.info("--- Starting Data & Analysis Pipeline ---")
-    for script in PIPELINE_SCRIPTS:
-        if not run_script(script):
+    # One pool for the whole run: workers keep their interpreter and imported libraries between steps
+    with ProcessPoolExecutor(max_workers=len(PARALLEL_STAGE)) as executor:
+        futures = [executor.submit(run_scraper_cached, module) for module in PARALLEL_STAGE]
+        if not all([future.result() for future in as_completed(futures)]):
             logging.critical("🛑 Pipeline halted due to critical error in previous step.")
             sys.exit(1)
+
+        for module in SERIAL_STAGES:
+            if executor.submit(run_stage, module).result() == CRASHED:
+                logging.critical("🛑 Pipeline halted due to critical error in previous step.")
+                sys.exit(1)
             
     # 2. Start the backend proxy server (non-blocking)
     backend_thread = start_backend()
@@ -9,22 +9,39 @@ echo "--- Starting Daily Audience Feedback Pipeline: $(date) ---"
 # The scripts are expected to be relative to this root.
 
 # 1. ACQUISITION PHASE: Run all scrapers to update the four source databases in the persistent storage path
+# The scrapers write to separate databases, so they run concurrently and we wait on each one.
 echo "1.1 Running Reddit Scraper..."
-python scrapers/get_reddit_data.py
+python scrapers/get_reddit_data.py &
+REDDIT_PID=$!
 
 echo "1.2 Running YouTube Scraper..."
-python scrapers/get_youtube_data.py
+python scrapers/get_youtube_data.py &
+YOUTUBE_PID=$!
 
 echo "1.3 Running App Store Scraper..."
-python scrapers/get_app_store_data.py
+python scrapers/get_app_store_data.py &
+APP_STORE_PID=$!
 
 echo "1.4 Running Google Play Scraper..."
-python scrapers/get_google_play_data.py
+python scrapers/get_google_play_data.py &
+GOOGLE_PLAY_PID=$!
+
+# 'set -e' does not cover background jobs. Wait on every scraper before failing, so none is
+# left writing to its database after the script exits.
+SCRAPER_FAILED=0
+wait $REDDIT_PID || { echo "❌ Reddit Scraper failed (exit code $?)"; SCRAPER_FAILED=1; }
+wait $YOUTUBE_PID || { echo "❌ YouTube Scraper failed (exit code $?)"; SCRAPER_FAILED=1; }
+wait $APP_STORE_PID || { echo "❌ App Store Scraper failed (exit code $?)"; SCRAPER_FAILED=1; }
+wait $GOOGLE_PLAY_PID || { echo "❌ Google Play Scraper failed (exit code $?)"; SCRAPER_FAILED=1; }
+if [ "$SCRAPER_FAILED" -ne 0 ]; then
+    echo "🛑 Pipeline halted: one or more scrapers failed."
+    exit 1
+fi
 
 
 # 2. CURATION PHASE: Consolidate data, apply final sampling, and prepare LLM input
 # Based on your master orchestration script, 'get_top_comments.py' handles this phase.
-echo "2.0 Running Curation Pipeline (Generates curated_data_for_llm.json)..."
+echo "2.0 Running Curation Pipeline (Generates curated_data_for_llm.jsonl)..."
 python scrapers/get_top_comments.py
 
 
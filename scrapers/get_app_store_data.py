@@ -1,40 +1,83 @@
-import pandas as pd
-import sqlite3
-from app_store_web_scraper import AppStoreEntry, AppStoreSession
-from datetime import datetime, timedelta
+from app_store_web_scraper import AppStoreEntry, AppStoreError, AppStoreSession
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from datetime import datetime, timedelta, timezone
 import logging
 import os
+import sqlite3
+import sys
+
+# --- CRITICAL PATH FIX ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from scrapers.scraper_utils import open_db, retry
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 DATA_DIR = os.environ.get("PERSISTENT_STORAGE_PATH", "data")
 DB_NAME = os.path.join(DATA_DIR, "app_reviews.db")
 TABLE_NAME = "economist_reviews"
+# Same columns the table had when it was written with pandas' to_sql
+CREATE_TABLE_SQL = f'''CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+    "Review Date" TIMESTAMP, "User Name" TEXT, "Rating" INTEGER, "Review Title" TEXT,
+    "Review Text" TEXT, "Review URL" TEXT, "Review ID" INTEGER, "version" TEXT
+)'''
+INSERT_SQL = f'''INSERT INTO {TABLE_NAME} ("Review Date", "User Name", "Rating", "Review Title", "Review Text", "Review URL", "Review ID", "version") VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+
+# Non-2xx API responses (after the session's own 429/503 retries) and network failures
+TRANSIENT_ERRORS = (AppStoreError, Urllib3HTTPError, ConnectionError, TimeoutError)
+
+@retry(TRANSIENT_ERRORS)
+def collect_reviews(app_entry, max_reviews, collected):
+    """Fills `collected` (review id -> review) so reviews from a failed attempt are kept."""
+    for review in app_entry.reviews(limit=max_reviews):
+        collected[review.id] = review
 
 def scrape_and_filter_reviews(app_name, app_id, country_code='us', days_to_look_back=30, max_reviews=5000):
     os.makedirs(os.path.dirname(DB_NAME), exist_ok=True)
-    cutoff_date = datetime.now() - timedelta(days=days_to_look_back)
-    all_reviews = []
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_to_look_back)
     base_url = f"https://apps.apple.com/{country_code}/app/{app_name.lower().replace(' ', '-')}/id{app_id}"
+    collected = {}
+    fetch_failed = False
     try:
+        # AppStoreSession pools its HTTPS connections, and retries reuse app_entry (and so the session)
         session = AppStoreSession(delay=5, delay_jitter=2)
         app_entry = AppStoreEntry(app_id=app_id, country=country_code, session=session)
-        for review in app_entry.reviews():
-            if len(all_reviews) >= max_reviews: break
-            all_reviews.append({
-                'Review Date': review.date, 'User Name': review.user_name, 'Rating': review.rating, 'Review Title': review.title, 'Review Text': review.content,
-                'Review URL': f"{base_url}?see-all=reviews&id={app_id}#review/{review.id}", 'Review ID': review.id, 'version': 'N/A' 
-            })
-    except: return
-    if not all_reviews: return
-    df = pd.DataFrame(all_reviews)
-    df['Review Date'] = pd.to_datetime(df['Review Date']).dt.tz_localize(None)
-    recent_df = df[df['Review Date'] >= cutoff_date]
+        collect_reviews(app_entry, max_reviews, collected)
+    except TRANSIENT_ERRORS as e:
+        logging.warning(f"App Store fetch failed after retries ({e}); keeping {len(collected)} partial reviews.")
+        fetch_failed = True
+    if not collected: return not fetch_failed
+    # Rows go straight to executemany as tuples in INSERT_SQL column order
+    rows = [
+        (r.date.strftime('%Y-%m-%d %H:%M:%S'), r.user_name, r.rating, r.title, r.content,
+         f"{base_url}?see-all=reviews&id={app_id}#review/{r.id}", r.id, 'N/A')
+        for r in collected.values() if r.date >= cutoff_date
+    ]
+    conn = open_db(DB_NAME)
     try:
-        conn = sqlite3.connect(DB_NAME)
-        recent_df.to_sql(TABLE_NAME, conn, if_exists='replace', index=False)
+        conn.execute(CREATE_TABLE_SQL)
+        # Curation reads the newest reviews first
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_as_date ON {TABLE_NAME} ("Review Date" DESC)')
+        with conn:
+            if fetch_failed:
+                # A partial fetch must not replace the stored snapshot: only add reviews it doesn't have yet
+                stored_ids = {str(row[0]) for row in conn.execute(f'SELECT "Review ID" FROM {TABLE_NAME}')}
+                rows = [row for row in rows if str(row[6]) not in stored_ids]
+            else:
+                # Replace the previous snapshot in one transaction (was to_sql(if_exists='replace'))
+                conn.execute(f"DELETE FROM {TABLE_NAME}")
+            conn.executemany(INSERT_SQL, rows)
+    except sqlite3.Error as e:
+        logging.error(f"Failed to store App Store reviews: {e}")
+        return False
+    finally:
         conn.close()
-    except: pass
+    return not fetch_failed
+
+def main():
+    return scrape_and_filter_reviews(app_name="The Economist", app_id="1239397626")
 
 if __name__ == "__main__":
-    scrape_and_filter_reviews(app_name="The Economist", app_id="1239397626")
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,7 +1,18 @@
-import sqlite3
 import os
+import sys
 import datetime
+import requests
+from requests.adapters import HTTPAdapter
 from google_play_scraper import Sort, reviews_all
+from google_play_scraper.exceptions import ExtraHTTPError, NotFoundError
+import google_play_scraper.utils.request as gp_request
+
+# --- CRITICAL PATH FIX ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from scrapers.scraper_utils import open_db, retry
 
 # --- Configuration ---
 APP_ID = 'com.economist.lamarr' 
@@ -10,29 +21,64 @@ DB_FILE = os.path.join(DATA_DIR, 'google_play_reviews.db')
 TABLE_NAME = 'google_play_reviews'
 DAYS_TO_FETCH = 30 
 
+# Rate limits (the library reports them as ExtraHTTPError) and network failures
+TRANSIENT_ERRORS = (ExtraHTTPError, requests.RequestException, ConnectionError, TimeoutError)
+
+# google_play_scraper opens a new urllib connection for every review page. Route its
+# transport through one keep-alive session so pagination reuses a single TCP+TLS connection.
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+def _pooled_urlopen(obj):
+    """Drop-in for google_play_scraper.utils.request._urlopen, keeping its error mapping."""
+    if isinstance(obj, str):
+        response = HTTP_SESSION.get(obj, timeout=30)
+    else:
+        response = HTTP_SESSION.request(obj.get_method(), obj.full_url, data=obj.data, headers=dict(obj.header_items()), timeout=30)
+    if response.status_code == 404:
+        raise NotFoundError("App not found(404).")
+    if response.status_code >= 400:
+        raise ExtraHTTPError(f"App not found. Status code {response.status_code} returned.")
+    return response.content.decode("UTF-8")
+
+gp_request._urlopen = _pooled_urlopen
+
 def initialize_db(db_path):
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    conn = sqlite3.connect(db_path)
+    conn = open_db(db_path)
     cursor = conn.cursor()
     cursor.execute(f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} (review_id TEXT PRIMARY KEY, user_name TEXT, review_date TEXT, review_text TEXT, rating INTEGER, device TEXT, url TEXT)")
+    # Curation reads the newest reviews first
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_gp_date ON {TABLE_NAME} (review_date DESC)")
     conn.commit()
     conn.close()
 
+@retry(TRANSIENT_ERRORS)
+def fetch_reviews():
+    return reviews_all(APP_ID, lang='en', country='us', sort=Sort.NEWEST)
+
 def fetch_and_store_reviews():
     initialize_db(DB_FILE)
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
     threshold = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=DAYS_TO_FETCH)
     try:
-        all_reviews = reviews_all(APP_ID, lang='en', country='us', sort=Sort.NEWEST)
-    except: return
+        all_reviews = fetch_reviews()
+    except TRANSIENT_ERRORS as e:
+        print(f"❌ ERROR: Google Play fetch failed after retries: {e}")
+        return False
+    rows = []
     for r in all_reviews:
         review_date_utc = r['at'].replace(tzinfo=datetime.timezone.utc)
         if review_date_utc < threshold: break 
-        data = (r['reviewId'], r['userName'], review_date_utc.strftime('%Y-%m-%d %H:%M:%S'), r['content'], r['score'], r.get('userDevice', 'N/A'), f"https://play.google.com/store/apps/details?id={APP_ID}")
-        cursor.execute(f"INSERT OR IGNORE INTO {TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?, ?)", data)
-    conn.commit()
+        rows.append((r['reviewId'], r['userName'], review_date_utc.strftime('%Y-%m-%d %H:%M:%S'), r['content'], r['score'], r.get('userDevice', 'N/A'), f"https://play.google.com/store/apps/details?id={APP_ID}"))
+    conn = open_db(DB_FILE)
+    # One transaction for the whole batch instead of one commit per review
+    with conn:
+        conn.executemany(f"INSERT OR IGNORE INTO {TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
     conn.close()
+    return True
+
+def main():
+    return fetch_and_store_reviews()
 
 if __name__ == '__main__':
-    fetch_and_store_reviews()
\ No newline at end of file
+    main()
\ No newline at end of file
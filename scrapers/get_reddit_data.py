@@ -4,12 +4,15 @@ import time
 from datetime import datetime
 import sys
 import os
+from collections import deque
 
 # --- CRITICAL PATH FIX ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+from scrapers.scraper_utils import open_db
+
 # --- DATABASE PATH ---
 DATA_DIR = os.environ.get("PERSISTENT_STORAGE_PATH", "data")
 DATABASE_NAME = os.path.join(DATA_DIR, "reddit_data.db")
@@ -36,6 +39,12 @@ except ImportError:
 
 MIN_DELAY_SECONDS = 60 / RATE_LIMIT_PER_MINUTE 
 
+# Each expanded "MoreComments" costs an extra API call: expand at most this many per post,
+# only when they hide at least REPLACE_MORE_THRESHOLD replies, and keep the first levels of a thread
+REPLACE_MORE_LIMIT = 32
+REPLACE_MORE_THRESHOLD = 5
+MAX_COMMENT_DEPTH = 4
+
 def initialize_reddit():
     if not CLIENT_ID or not CLIENT_SECRET:
         print("❌ ERROR: REDDIT_CLIENT_ID or REDDIT_CLIENT_SECRET not set in environment.")
@@ -55,7 +64,7 @@ def initialize_reddit():
 
 def initialize_database(db_name):
     os.makedirs(os.path.dirname(db_name), exist_ok=True)
-    conn = sqlite3.connect(db_name)
+    conn = open_db(db_name)
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS reddit_posts (
@@ -71,25 +80,31 @@ def initialize_database(db_name):
             FOREIGN KEY (post_id) REFERENCES reddit_posts (post_id)
         )
     """)
+    # Serve the curation query (top posts by score, then their comments) from indexes
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_score ON reddit_posts (score DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_post_score ON reddit_comments (post_id, score DESC)")
     conn.commit()
     return conn, cursor
 
-def process_comments(comment_list, post_id, cursor, conn):
-    comments_inserted = 0
-    for comment in comment_list:
+def process_comments(comment_list, post_id, cursor):
+    rows = []
+    # Breadth-first walk: no Python recursion, so deep threads cannot hit the recursion limit
+    queue = deque((comment, 1) for comment in comment_list)
+    while queue:
+        comment, depth = queue.popleft()
         if isinstance(comment, praw.models.MoreComments): continue
         try:
             author_name = comment.author.name if comment.author else "[deleted]"
-            comment_data = (comment.id, post_id, comment.parent_id, author_name, comment.body, comment.score, comment.created_utc)
-            cursor.execute("INSERT OR IGNORE INTO reddit_comments VALUES (?, ?, ?, ?, ?, ?, ?)", comment_data)
-            comments_inserted += 1
-            if comment.replies:
-                comments_inserted += process_comments(comment.replies, post_id, cursor, conn)
+            rows.append((comment.id, post_id, comment.parent_id, author_name, comment.body, comment.score, comment.created_utc))
+            if depth < MAX_COMMENT_DEPTH:
+                queue.extend((reply, depth + 1) for reply in comment.replies)
         except: pass 
-    return comments_inserted
+    cursor.executemany("INSERT OR IGNORE INTO reddit_comments VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
 
 def run_scraper(reddit, conn, cursor):
-    if not reddit: return
+    """Returns False when Reddit is unreachable (no credentials or every retry failed)."""
+    if not reddit: return False
     subreddit = reddit.subreddit(SUBREDDIT_NAME)
     retry_count = 0
     while retry_count < MAX_RETRIES:
@@ -99,20 +114,25 @@ def run_scraper(reddit, conn, cursor):
                 post_data = (submission.id, SUBREDDIT_NAME, submission.title, submission.score, submission.upvote_ratio, submission.num_comments, submission.created_utc, submission.url)
                 try:
                     cursor.execute("INSERT INTO reddit_posts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", post_data)
-                    submission.comments.replace_more(limit=None) 
-                    process_comments(submission.comments.list(), submission.id, cursor, conn)
+                    submission.comments.replace_more(limit=REPLACE_MORE_LIMIT, threshold=REPLACE_MORE_THRESHOLD) 
+                    # Walk from the top-level comments; process_comments descends into replies itself
+                    process_comments(submission.comments, submission.id, cursor)
+                    conn.commit()
                 except sqlite3.IntegrityError: pass
                 time.sleep(MIN_DELAY_SECONDS)
-            conn.commit()
-            break
+            return True
         except Exception as e:
             retry_count += 1
             time.sleep(BACKOFF_FACTOR ** retry_count)
+    return False
 
-if __name__ == "__main__":
+def main():
     reddit_instance = initialize_reddit()
     db_connection, db_cursor = initialize_database(DATABASE_NAME)
     try:
-        run_scraper(reddit_instance, db_connection, db_cursor)
+        return run_scraper(reddit_instance, db_connection, db_cursor)
     finally:
-        db_connection.close()
\ No newline at end of file
+        db_connection.close()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,8 +1,15 @@
 import sqlite3
-import json
 import sys
 import os
-from typing import List, Dict, Any, Optional
+import orjson
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+# --- CRITICAL PATH FIX ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from scrapers.scraper_utils import open_db, attach_db
 
 # ==============================================================================
 # CONFIGURATION - UPDATED FOR RENDER PERSISTENT DISK
@@ -15,6 +22,14 @@ YOUTUBE_DB = os.path.join(DATA_DIR, "youtube_comments.db")
 APP_STORE_DB = os.path.join(DATA_DIR, "app_reviews.db")
 GOOGLE_PLAY_DB = os.path.join(DATA_DIR, "google_play_reviews.db")
 
+# Schema name each source database is ATTACHed under on the shared connection
+SOURCE_DBS = {
+    "reddit": REDDIT_DB,
+    "youtube": YOUTUBE_DB,
+    "app_store": APP_STORE_DB,
+    "google_play": GOOGLE_PLAY_DB,
+}
+
 # --- Quantitative Limits ---
 REDDIT_POST_LIMIT = 200      
 YT_COMMENT_LIMIT = 200      
@@ -23,18 +38,47 @@ GP_REVIEW_LIMIT = 500
 
 # --- Output Configuration ---
 # Ensure curated output is also saved to the persistent disk
-OUTPUT_FILENAME = os.path.join(DATA_DIR, "curated_data_for_llm.json") 
+OUTPUT_FILENAME = os.path.join(DATA_DIR, "curated_data_for_llm.jsonl") 
+
+# --- Queries (built once at import) ---
+FETCH_BATCH_SIZE = 1000
+REDDIT_COMMENTS_SQL = """
+    SELECT c.comment_id, c.post_id, c.body, c.created_utc
+    FROM reddit.reddit_comments c
+    JOIN (SELECT post_id FROM reddit.reddit_posts ORDER BY score DESC LIMIT ?) p USING (post_id)
+    ORDER BY c.score DESC
+"""
+YOUTUBE_SQL = "SELECT text_display, comment_id FROM youtube.youtube_comments ORDER BY like_count DESC LIMIT ?"
+APP_STORE_SQL = 'SELECT "Review ID", "Review Title", "Review Text" FROM app_store.economist_reviews ORDER BY "Review Date" DESC LIMIT ?'
+GOOGLE_PLAY_SQL = "SELECT review_id, review_text, rating FROM google_play.google_play_reviews ORDER BY review_date DESC LIMIT ?"
 # ==============================================================================
 
-def connect_db(db_name: str) -> Optional[sqlite3.Connection]:
-    """Establishes a connection to a specific database."""
-    if not os.path.exists(db_name):
-        return None
-    try:
-        conn = sqlite3.connect(db_name)
-        return conn
-    except sqlite3.OperationalError:
-        return None
+def connect_sources() -> Tuple[Optional[sqlite3.Connection], Set[str]]:
+    """Opens one connection and ATTACHes every source database that exists.
+
+    All curation queries then run on a single connection; each attached schema keeps
+    its own page cache, sized by attach_db.
+    """
+    available = {name: path for name, path in SOURCE_DBS.items() if os.path.exists(path)}
+    if not available:
+        return None, set()
+    conn = open_db(":memory:")
+    attached = set()
+    for name, path in available.items():
+        try:
+            attach_db(conn, path, name)
+            attached.add(name)
+        except sqlite3.OperationalError as e:
+            print(f"Skipping '{path}': {e}")
+    return conn, attached
+
+def stream_rows(cursor: sqlite3.Cursor):
+    """Yields query results in FETCH_BATCH_SIZE chunks instead of one fetchall() list."""
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not batch:
+            return
+        yield from batch
 
 def get_top_reddit_data(conn: Optional[sqlite3.Connection]) -> List[Dict[str, str]]:
     if not conn:
@@ -42,15 +86,10 @@ def get_top_reddit_data(conn: Optional[sqlite3.Connection]) -> List[Dict[str, st
         return []
     cursor = conn.cursor()
     flattened_reddit_comments = []
-    cursor.execute("SELECT post_id FROM reddit_posts ORDER BY score DESC LIMIT ?", (REDDIT_POST_LIMIT,))
-    top_post_ids = [p[0] for p in cursor.fetchall()]
-    if not top_post_ids: return []
-    placeholders = ','.join('?' for _ in top_post_ids)
-    
-    # REDDIT CHANGE: Added created_utc to the SELECT statement
-    cursor.execute(f"SELECT comment_id, post_id, body, created_utc FROM reddit_comments WHERE post_id IN ({placeholders}) ORDER BY score DESC", tuple(top_post_ids))
+    # Comments of the top REDDIT_POST_LIMIT posts, joined in SQLite instead of an IN (...) list
+    cursor.execute(REDDIT_COMMENTS_SQL, (REDDIT_POST_LIMIT,))
     
-    for comment_id, post_id, body, created_utc in cursor.fetchall():
+    for comment_id, post_id, body, created_utc in stream_rows(cursor):
         flattened_reddit_comments.append({
             "id": f"R_{post_id}:{comment_id}", 
             "text": body.strip(),
@@ -65,8 +104,8 @@ def get_top_youtube_data(conn: Optional[sqlite3.Connection]) -> List[Dict[str, s
         return []
     cursor = conn.cursor()
     flattened_youtube_comments = []
-    cursor.execute("SELECT text_display, comment_id FROM youtube_comments ORDER BY like_count DESC LIMIT ?", (YT_COMMENT_LIMIT,))
-    for body, comment_id in cursor.fetchall():
+    cursor.execute(YOUTUBE_SQL, (YT_COMMENT_LIMIT,))
+    for body, comment_id in stream_rows(cursor):
         flattened_youtube_comments.append({"id": f"YT_{comment_id}", "text": body.strip()})
     print(f"✅ Extracted {len(flattened_youtube_comments)} YouTube comments.")
     return flattened_youtube_comments
@@ -77,8 +116,8 @@ def get_app_store_reviews(conn: Optional[sqlite3.Connection]) -> List[Dict[str,
         return []
     cursor = conn.cursor()
     flattened_reviews = []
-    cursor.execute('SELECT "Review ID", "Review Title", "Review Text" FROM economist_reviews ORDER BY "Review Date" DESC LIMIT ?', (APP_REVIEW_LIMIT,))
-    for review_id, title, text in cursor.fetchall():
+    cursor.execute(APP_STORE_SQL, (APP_REVIEW_LIMIT,))
+    for review_id, title, text in stream_rows(cursor):
         combined_text = f"{(title.strip() if title else '')}\n\n{(text.strip() if text else '')}".strip()
         flattened_reviews.append({"id": f"AS_{review_id}", "text": combined_text})
     print(f"✅ Extracted {len(flattened_reviews)} App Store reviews.")
@@ -91,36 +130,48 @@ def get_google_play_reviews(conn: Optional[sqlite3.Connection]) -> List[Dict[str
     cursor = conn.cursor()
     flattened_reviews = []
     # RESTORED: Uses 'rating' column exactly as in your provided snippet
-    cursor.execute("SELECT review_id, review_text, rating FROM google_play_reviews ORDER BY review_date DESC LIMIT ?", (GP_REVIEW_LIMIT,))
-    for review_id, text, rating in cursor.fetchall():
+    cursor.execute(GOOGLE_PLAY_SQL, (GP_REVIEW_LIMIT,))
+    for review_id, text, rating in stream_rows(cursor):
         combined_text = f"Rating: {rating}/5\n\n{(text.strip() if text else '')}".strip()
         flattened_reviews.append({"id": f"GP_{review_id}", "text": combined_text})
     print(f"✅ Extracted {len(flattened_reviews)} Google Play reviews.")
     return flattened_reviews
 
+def dedupe_by_id(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keeps the first item for each ID so no feedback is sent to the LLM twice."""
+    seen = set()
+    unique_items = []
+    for item in items:
+        if item["id"] in seen: continue
+        seen.add(item["id"])
+        unique_items.append(item)
+    return unique_items
+
 def main():
     print("--- Starting Final Curation Pipeline ---")
     os.makedirs(DATA_DIR, exist_ok=True)
-    reddit_conn = connect_db(REDDIT_DB)
-    youtube_conn = connect_db(YOUTUBE_DB)
-    app_store_conn = connect_db(APP_STORE_DB)
-    google_play_conn = connect_db(GOOGLE_PLAY_DB)
+    conn, attached = connect_sources()
     
-    if not any([reddit_conn, youtube_conn, app_store_conn, google_play_conn]):
+    if not attached:
         print(f"❌ FATAL: No database files were found in the storage folder: {DATA_DIR}")
         sys.exit(1)
 
-    all_data_for_llm = (get_top_reddit_data(reddit_conn) + 
-                        get_top_youtube_data(youtube_conn) + 
-                        get_app_store_reviews(app_store_conn) + 
-                        get_google_play_reviews(google_play_conn))
+    def source(name: str) -> Optional[sqlite3.Connection]:
+        return conn if name in attached else None
+
+    all_data_for_llm = (get_top_reddit_data(source("reddit")) + 
+                        get_top_youtube_data(source("youtube")) + 
+                        get_app_store_reviews(source("app_store")) + 
+                        get_google_play_reviews(source("google_play")))
+    all_data_for_llm = dedupe_by_id(all_data_for_llm)
     
-    with open(OUTPUT_FILENAME, 'w', encoding='utf-8') as f:
-        json.dump(all_data_for_llm, f, indent=2)
+    # JSON Lines: one compact object per item, so the LLM step can stream it line by line
+    with open(OUTPUT_FILENAME, 'wb') as f:
+        for item in all_data_for_llm:
+            f.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE))
     
     print(f"✅ Exported {len(all_data_for_llm)} items to: {OUTPUT_FILENAME}")
-    for c in [reddit_conn, youtube_conn, app_store_conn, google_play_conn]:
-        if c: c.close()
+    conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
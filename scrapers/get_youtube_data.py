@@ -1,15 +1,23 @@
 import sqlite3
 import datetime
+import functools
 import time
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # --- CRITICAL PATH FIX ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+import httplib2
+import orjson
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
+from scrapers.scraper_utils import open_db, multi_insert, RateLimiter
 
 # --- DATABASE PATH ---
 DATA_DIR = os.environ.get("PERSISTENT_STORAGE_PATH", "data")
@@ -23,13 +31,60 @@ try:
 except ImportError:
     CHANNEL_ID = os.environ.get("YOUTUBE_CHANNEL_ID", "UC0p5jTq6Xx_DosDFxVXnWaQ")
     TIME_FILTER_DAYS = int(os.environ.get("YOUTUBE_FILTER_DAYS", 30))
-    MAX_COMMENTS_PER_PAGE = 50
+    MAX_COMMENTS_PER_PAGE = 100
 
 YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION = "youtube", "v3"
+VIDEO_COLUMNS = ("video_id", "title", "published_at", "view_count", "comment_count")
+COMMENT_COLUMNS = ("comment_id", "video_id", "author_id", "text_display", "like_count", "published_at")
+
+# --- SQL (kept as constants so sqlite3's statement cache reuses the prepared statements) ---
+CACHED_STATEMENTS = 256
+_STORED_COUNTS_SQL = "SELECT video_id, comment_count FROM youtube_videos"
+_SCRAPE_STATE_SQL = "SELECT video_id, page_token, fully_paged FROM youtube_scrape_state"
+_WATERMARKS_SQL = "SELECT video_id, MAX(published_at) FROM youtube_comments GROUP BY video_id"
+_SAVE_SCRAPE_STATE_SQL = "INSERT OR REPLACE INTO youtube_scrape_state (video_id, page_token, fully_paged) VALUES (?, ?, ?)"
+_CLEAR_SCRAPE_STATE_SQL = "DELETE FROM youtube_scrape_state WHERE video_id = ?"
+_UPDATE_VIDEO_STATS_SQL = "UPDATE youtube_videos SET view_count = ?, comment_count = ? WHERE video_id = ?"
+_COMMENT_IDS_SQL = "SELECT comment_id FROM youtube_comments"
+_AUTHOR_IDS_SQL = "SELECT name, author_id FROM youtube_authors"
+_NEW_AUTHOR_IDS_SQL = "SELECT name, author_id FROM youtube_authors WHERE author_id > ?"
+_INSERT_AUTHOR_SQL = "INSERT OR IGNORE INTO youtube_authors (name) VALUES (?)"
+
+# Partial responses: only the fields the scraper reads come back over the wire
+CHANNEL_FIELDS = "items/contentDetails/relatedPlaylists/uploads"
+PLAYLIST_FIELDS = "items/contentDetails(videoId,videoPublishedAt),nextPageToken"
+VIDEO_FIELDS = "items(id,snippet(title,publishedAt),statistics(viewCount,commentCount))"
+STATS_FIELDS = "items(id,statistics(viewCount,commentCount))"
+COMMENT_FIELDS = "items(id,snippet/topLevelComment/snippet(authorDisplayName,textDisplay,likeCount,publishedAt)),nextPageToken"
+
+# channel_id -> uploads playlist ID; it never changes for a channel, so skip channels().list for 30 days
+CACHE_FILE = os.path.join(DATA_DIR, "yt_cache.json")
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# Connections are kept alive and reused; the discovery document ships with the client library
+HTTP_TIMEOUT = 30
+
+# Comment threads are fetched concurrently; SQLite writes stay on the main thread
+COMMENT_WORKERS = int(os.environ.get("YOUTUBE_COMMENT_WORKERS", 8))
+# Comment rows are buffered across videos and written BATCH_SIZE at a time
+BATCH_SIZE = 1000
+_thread_local = threading.local()
+
+# Shared across worker threads; replaces the fixed one-second sleep per video
+API_LIMITER = RateLimiter(qps=float(os.environ.get("YOUTUBE_QPS", 10)))
+
+# Transient failures are retried with 1s, 2s, 4s... backoff; a spent daily quota stops the run
+RETRY_STATUSES = (429, 500, 502, 503)
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+MAX_TRIES = 5
+
+class QuotaExceeded(Exception):
+    """The YouTube Data API daily quota is used up; the next run picks up from what was stored."""
 
 def initialize_database(db_name):
     os.makedirs(os.path.dirname(db_name), exist_ok=True)
-    conn = sqlite3.connect(db_name)
+    conn = open_db(db_name, cached_statements=CACHED_STATEMENTS)
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS youtube_videos (
@@ -37,59 +92,286 @@ def initialize_database(db_name):
             view_count INTEGER, comment_count INTEGER
         )
     """)
+    # Commenter names repeat across many comments, so each is stored once and referenced by ID
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS youtube_authors (
+            author_id INTEGER PRIMARY KEY, name TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_yt_author_name ON youtube_authors (name)")
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS youtube_comments (
-            comment_id TEXT PRIMARY KEY, video_id TEXT, author_display_name TEXT, 
+            comment_id TEXT PRIMARY KEY, video_id TEXT, author_id INTEGER, 
             text_display TEXT, like_count INTEGER, published_at TEXT,
-            FOREIGN KEY (video_id) REFERENCES youtube_videos (video_id)
+            FOREIGN KEY (video_id) REFERENCES youtube_videos (video_id),
+            FOREIGN KEY (author_id) REFERENCES youtube_authors (author_id)
         )
     """)
+    migrate_author_names(cursor)
+    migrate_scrape_state(cursor)
+    cursor.execute(_CREATE_SCRAPE_STATE_SQL)
+    # Curation reads the most-liked comments first
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_yt_likes ON youtube_comments (like_count DESC)")
     conn.commit()
     return conn, cursor
 
+def migrate_author_names(cursor):
+    """Moves author_display_name from databases created before youtube_authors into author_id."""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(youtube_comments)")}
+    if "author_display_name" not in columns: return
+    if "author_id" not in columns:
+        cursor.execute("ALTER TABLE youtube_comments ADD COLUMN author_id INTEGER REFERENCES youtube_authors (author_id)")
+    cursor.execute("INSERT OR IGNORE INTO youtube_authors (name) SELECT DISTINCT author_display_name FROM youtube_comments WHERE author_display_name IS NOT NULL")
+    cursor.execute("UPDATE youtube_comments SET author_id = (SELECT author_id FROM youtube_authors WHERE name = author_display_name) WHERE author_id IS NULL")
+    # DROP COLUMN needs SQLite 3.35+; older builds keep the (no longer written) column
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        cursor.execute("ALTER TABLE youtube_comments DROP COLUMN author_display_name")
+
+# page_token: page to resume a video's comment pagination from after an interrupted run.
+# fully_paged: the thread has been paged to its end in time order, so the newest stored
+# comment is a safe watermark (databases filled by order='relevance' only hold the top 50).
+_CREATE_SCRAPE_STATE_SQL = """
+    CREATE TABLE IF NOT EXISTS youtube_scrape_state (
+        video_id TEXT PRIMARY KEY, page_token TEXT, fully_paged INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+def migrate_scrape_state(cursor):
+    """Rebuilds a youtube_scrape_state created before fully_paged, when page_token was NOT NULL."""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(youtube_scrape_state)")}
+    if not columns or "fully_paged" in columns: return
+    cursor.execute("ALTER TABLE youtube_scrape_state RENAME TO youtube_scrape_state_old")
+    cursor.execute(_CREATE_SCRAPE_STATE_SQL)
+    cursor.execute("INSERT INTO youtube_scrape_state (video_id, page_token) SELECT video_id, page_token FROM youtube_scrape_state_old")
+    cursor.execute("DROP TABLE youtube_scrape_state_old")
+
+def with_author_ids(cursor, rows, author_ids):
+    """Swaps each row's author name for its youtube_authors ID, adding names not seen before in one batch."""
+    new_names = {row[2] for row in rows} - author_ids.keys()
+    if new_names:
+        last_known_id = max(author_ids.values(), default=0)
+        cursor.executemany(_INSERT_AUTHOR_SQL, [(name,) for name in new_names])
+        # New rows get IDs above every ID already in the map, so one range query picks them all up
+        author_ids.update(cursor.execute(_NEW_AUTHOR_IDS_SQL, (last_known_id,)))
+    return [(comment_id, v_id, author_ids[name], text, likes, published_at)
+            for comment_id, v_id, name, text, likes, published_at in rows]
+
+def _error_reasons(error):
+    try: return {err.get('reason') for err in orjson.loads(error.content)['error']['errors']}
+    except (ValueError, KeyError, TypeError, AttributeError): return set()
+
+def with_retry(fn, tries=MAX_TRIES):
+    for attempt in range(tries):
+        try:
+            return fn()
+        except HttpError as e:
+            reasons = _error_reasons(e)
+            if reasons & QUOTA_REASONS: raise QuotaExceeded(e.reason) from e
+            retryable = e.resp.status in RETRY_STATUSES or (e.resp.status == 403 and reasons & RATE_LIMIT_REASONS)
+            if not retryable or attempt == tries - 1: raise
+            print(f"⚠️ YouTube API returned {e.resp.status}; retry {attempt + 1}/{tries - 1} in {2 ** attempt}s")
+            time.sleep(2 ** attempt)
+
+def api_execute(request, http=None):
+    """Executes a googleapiclient request under API_LIMITER, retrying transient HttpErrors."""
+    def call():
+        API_LIMITER.acquire()
+        return request.execute(http=http)
+    return with_retry(call)
+
+class OrjsonModel(JsonModel):
+    """JsonModel that decodes API responses with orjson instead of the stdlib json module."""
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return content.decode("utf-8") if isinstance(content, bytes) else content
+        if self._data_wrapper and isinstance(body, dict) and "data" in body:
+            body = body["data"]
+        return body
+
 def get_youtube_service():
     if not YOUTUBE_API_KEY:
         print("❌ ERROR: YOUTUBE_API_KEY not set in environment.")
         return None
-    return build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION, developerKey=YOUTUBE_API_KEY)
+    return build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION, developerKey=YOUTUBE_API_KEY,
+                 http=httplib2.Http(timeout=HTTP_TIMEOUT), cache_discovery=False, static_discovery=True,
+                 model=OrjsonModel())
 
-def get_recent_videos(youtube, channel_id, days):
-    time_cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
-    channel_response = youtube.channels().list(id=channel_id, part='contentDetails').execute()
+def _load_cache():
+    try:
+        with open(CACHE_FILE, 'rb') as f: return orjson.loads(f.read())
+    except (OSError, ValueError): return {}
+
+@functools.lru_cache(maxsize=None)
+def get_uploads_playlist_id(youtube, channel_id):
+    cache = _load_cache()
+    entry = cache.get(channel_id)
+    if entry and time.time() - entry.get('cached_at', 0) < CACHE_TTL_SECONDS:
+        return entry['uploads_id']
+    channel_response = api_execute(youtube.channels().list(id=channel_id, part='contentDetails', fields=CHANNEL_FIELDS))
     uploads_id = channel_response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
-    playlist_items = youtube.playlistItems().list(playlistId=uploads_id, part='contentDetails', maxResults=50).execute()
-    video_ids = []
-    for item in playlist_items.get('items', []):
-        v_id = item['contentDetails']['videoId']
-        v_details = youtube.videos().list(id=v_id, part='snippet,statistics').execute()
-        if not v_details.get('items'): continue
-        v_item = v_details['items'][0]
-        published_at = datetime.datetime.fromisoformat(v_item['snippet']['publishedAt'].replace('Z', '+00:00'))
-        if published_at > time_cutoff: video_ids.append(v_item)
-    return video_ids
-
-def scrape_comments(youtube, conn, cursor, video_item):
-    v_id, title = video_item['id'], video_item['snippet']['title']
-    stats = video_item['statistics']
-    cursor.execute("INSERT OR IGNORE INTO youtube_videos VALUES (?, ?, ?, ?, ?)", 
-                   (v_id, title, video_item['snippet']['publishedAt'], int(stats.get('viewCount', 0)), int(stats.get('commentCount', 0))))
+    cache[channel_id] = {'uploads_id': uploads_id, 'cached_at': time.time()}
     try:
-        response = youtube.commentThreads().list(part='snippet', videoId=v_id, textFormat='plainText', order='relevance', maxResults=MAX_COMMENTS_PER_PAGE).execute()
-        for item in response.get('items', []):
-            snippet = item['snippet']['topLevelComment']['snippet']
-            cursor.execute("INSERT OR IGNORE INTO youtube_comments VALUES (?, ?, ?, ?, ?, ?)", 
-                           (item['id'], v_id, snippet['authorDisplayName'], snippet['textDisplay'], snippet.get('likeCount', 0), snippet['publishedAt']))
-        time.sleep(1)
-    except: pass
+        with open(CACHE_FILE, 'wb') as f: f.write(orjson.dumps(cache))
+    except OSError as e: print(f"⚠️ Could not write {CACHE_FILE}: {e}")
+    return uploads_id
+
+def _video_details(youtube, ids, part, fields):
+    details = []
+    # videos().list takes up to 50 comma-separated IDs: one request/quota unit instead of one per video
+    for start in range(0, len(ids), 50):
+        response = api_execute(youtube.videos().list(id=",".join(ids[start:start + 50]), part=part, maxResults=50, fields=fields))
+        details.extend(response.get('items', []))
+    return details
+
+def get_recent_videos(youtube, channel_id, days, known=frozenset()):
+    """Returns the videos uploaded within `days`; IDs in `known` come back with statistics only."""
+    # publishedAt is fixed-width UTC RFC 3339 ("...Z"), so plain string comparison orders it correctly
+    time_cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    uploads_id = get_uploads_playlist_id(youtube, channel_id)
+    recent_ids, token = [], None
+    # Uploads come newest first: page until a page reaches past the cutoff
+    while True:
+        page = api_execute(youtube.playlistItems().list(playlistId=uploads_id, part='contentDetails', maxResults=50, pageToken=token, fields=PLAYLIST_FIELDS))
+        published = [(item['contentDetails']['videoId'], item['contentDetails']['videoPublishedAt'])
+                     for item in page.get('items', []) if 'videoPublishedAt' in item['contentDetails']]
+        recent_ids.extend(v_id for v_id, published_at in published if published_at > time_cutoff)
+        token = page.get('nextPageToken')
+        if not token or not published or min(published_at for _, published_at in published) <= time_cutoff: break
+    new_ids = [v_id for v_id in recent_ids if v_id not in known]
+    known_ids = [v_id for v_id in recent_ids if v_id in known]
+    return (_video_details(youtube, new_ids, 'snippet,statistics', VIDEO_FIELDS) +
+            _video_details(youtube, known_ids, 'statistics', STATS_FIELDS))
+
+def comment_count(video_item):
+    return int(video_item['statistics'].get('commentCount', 0))
+
+def video_row(video_item, scraped=True):
+    """comment_count stays NULL until the video's comments have been stored."""
+    stats = video_item['statistics']
+    return (video_item['id'], video_item['snippet']['title'], video_item['snippet']['publishedAt'], int(stats.get('viewCount', 0)), comment_count(video_item) if scraped else None)
+
+def _thread_http():
+    """httplib2.Http is not thread-safe, so each worker thread keeps its own."""
+    if not hasattr(_thread_local, "http"): _thread_local.http = httplib2.Http(timeout=HTTP_TIMEOUT)
+    return _thread_local.http
+
+def fetch_comments(youtube, v_id, watermark=None, page_token=None):
+    """Pages through a video's comment threads, newest first, until reaching `watermark`.
+
+    Returns (rows, resume_token, status): status is "done", "failed", "quota", or "stale"
+    when the API rejects the `page_token` passed in; resume_token is the page the next
+    run should continue from (None when complete or stale).
+    """
+    rows = []
+    start_token = page_token
+    request = youtube.commentThreads().list(part='snippet', videoId=v_id, textFormat='plainText', order='time', maxResults=MAX_COMMENTS_PER_PAGE, pageToken=page_token, fields=COMMENT_FIELDS)
+    while request is not None:
+        try:
+            response = api_execute(request, http=_thread_http())
+        except QuotaExceeded:
+            return rows, page_token, "quota"
+        except HttpError as e:
+            if 'commentsDisabled' in _error_reasons(e): return rows, None, "done"
+            print(f"⚠️ Comments for {v_id} failed: {e}")
+            # A rejected resume token (e.g. invalidPageToken) would fail the same way on every run
+            if start_token is not None and page_token == start_token and 400 <= e.resp.status < 500 and e.resp.status not in RETRY_STATUSES:
+                return rows, None, "stale"
+            return rows, page_token, "failed"
+        except (OSError, httplib2.HttpLib2Error) as e:
+            print(f"⚠️ Comments for {v_id} failed: {e}")
+            return rows, page_token, "failed"
+        page = [(item['id'], v_id, snippet['authorDisplayName'], snippet['textDisplay'], snippet.get('likeCount', 0), snippet['publishedAt'])
+                for item in response.get('items', [])
+                for snippet in [item['snippet']['topLevelComment']['snippet']]]
+        rows.extend(row for row in page if watermark is None or row[5] >= watermark)
+        # Everything past this page was stored by an earlier run
+        if watermark and page and page[-1][5] <= watermark: break
+        page_token = response.get('nextPageToken')
+        request = youtube.commentThreads().list_next(request, response)
+    return rows, None, "done"
 
 def main():
     service = get_youtube_service()
-    if not service: return
+    if not service: return False
     conn, cursor = initialize_database(DATABASE_NAME)
-    videos = get_recent_videos(service, CHANNEL_ID, TIME_FILTER_DAYS)
-    for v in videos: scrape_comments(service, conn, cursor, v)
+    stored_counts = dict(cursor.execute(_STORED_COUNTS_SQL))
+    try:
+        videos = get_recent_videos(service, CHANNEL_ID, TIME_FILTER_DAYS, stored_counts)
+    except QuotaExceeded as e:
+        print(f"❌ YouTube daily quota exceeded ({e}); stopping until it resets.")
+        conn.close()
+        return False
+    scrape_state = cursor.execute(_SCRAPE_STATE_SQL).fetchall()
+    resume_tokens = {v_id: token for v_id, token, _ in scrape_state if token}
+    fully_paged = {v_id for v_id, _, paged in scrape_state if paged}
+    watermarks = dict(cursor.execute(_WATERMARKS_SQL))
+    # Nothing to fetch for videos without comments or whose count hasn't moved since the last run,
+    # unless the thread has never been paged in full (e.g. stored by the old top-50 relevance scrape)
+    to_scrape = [v for v in videos if comment_count(v) and
+                 (comment_count(v) != stored_counts.get(v['id']) or v['id'] not in fully_paged)]
+    pending = {v['id'] for v in to_scrape}
+
+    def fetch(video):
+        """Returns fetch_comments' (rows, resume_token, status) plus whether the thread is now fully paged."""
+        v_id = video['id']
+        if v_id in resume_tokens:
+            # A resumed video continues into older pages, so no watermark applies to it
+            older, resume_token, status = fetch_comments(service, v_id, page_token=resume_tokens[v_id])
+            # The stored token is unusable: fetch the whole thread again; stored IDs are filtered out below
+            if status == "stale":
+                rows, resume_token, status = fetch_comments(service, v_id)
+                return rows, resume_token, status, status == "done"
+            if status != "done": return older, resume_token, status, v_id in fully_paged
+            # The interrupted pass covered the pages above the token, so the thread is now paged in
+            # full; pick up comments posted since then from the top of the thread
+            newer, resume_token, status = fetch_comments(service, v_id, watermark=watermarks.get(v_id))
+            return older + newer, resume_token, status, True
+        # The watermark is only trusted once the whole thread has been paged in time order
+        rows, resume_token, status = fetch_comments(service, v_id, watermark=watermarks.get(v_id) if v_id in fully_paged else None)
+        return rows, resume_token, status, v_id in fully_paged or status == "done"
+
+    author_ids = dict(cursor.execute(_AUTHOR_IDS_SQL))
+    # Comments already stored are dropped in Python before they reach SQLite
+    existing_ids = {row[0] for row in cursor.execute(_COMMENT_IDS_SQL)}
+    comment_buffer = []
+    quota_stop = False
+
+    def flush():
+        multi_insert(cursor, "youtube_comments", COMMENT_COLUMNS, with_author_ids(cursor, comment_buffer, author_ids))
+        comment_buffer.clear()
+
+    # One BEGIN/COMMIT around every insert batch of the run
+    with conn, ThreadPoolExecutor(max_workers=COMMENT_WORKERS) as pool:
+        multi_insert(cursor, "youtube_videos", VIDEO_COLUMNS, [video_row(v, v['id'] not in pending) for v in videos if v['id'] not in stored_counts])
+        for video, (rows, resume_token, status, paged) in zip(to_scrape, pool.map(fetch, to_scrape)):
+            fresh = [row for row in rows if row[0] not in existing_ids]
+            existing_ids.update(row[0] for row in fresh)
+            comment_buffer.extend(fresh)
+            if len(comment_buffer) >= BATCH_SIZE: flush()
+            if resume_token or paged:
+                cursor.execute(_SAVE_SCRAPE_STATE_SQL, (video['id'], resume_token, int(paged)))
+            else:
+                cursor.execute(_CLEAR_SCRAPE_STATE_SQL, (video['id'],))
+            # An unfinished fetch clears the stored count so the next run tries the video again
+            cursor.execute(_UPDATE_VIDEO_STATS_SQL,
+                           (int(video['statistics'].get('viewCount', 0)), comment_count(video) if status == "done" else None, video['id']))
+            if status == "quota":
+                # Keep (commit) everything fetched so far; unprocessed videos keep their old counts
+                print("❌ YouTube daily quota exceeded; stopping until it resets.")
+                quota_stop = True
+                pool.shutdown(cancel_futures=True)
+                break
+        flush()
+    # Built after the bulk load so inserts don't maintain it row by row
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_comments_video_pub ON youtube_comments (video_id, published_at DESC)")
+    cursor.execute("ANALYZE")
     conn.commit()
     conn.close()
+    # A quota stop keeps what was fetched but is not a complete scrape
+    return not quota_stop
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+import functools
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+# Read tuning that SQLite keeps per schema: every ATTACHed database has its own
+# page cache and mmap window, so attach_db repeats these for each one.
+SCHEMA_PRAGMAS = (
+    "cache_size=-64000",
+    "mmap_size=268435456",
+)
+
+# Applied to every scraper/curation connection: WAL + relaxed fsync for the
+# bulk writes, a larger page cache and memory-mapped reads for the curation queries.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    *(f"PRAGMA {pragma}" for pragma in SCHEMA_PRAGMAS),
+    "PRAGMA busy_timeout=5000",
+)
+
+def open_db(db_path: str, **connect_kwargs) -> sqlite3.Connection:
+    """Opens a SQLite connection with the shared performance PRAGMAs applied.
+
+    Extra keyword arguments (e.g. cached_statements) are passed to sqlite3.connect.
+    """
+    conn = sqlite3.connect(db_path, **connect_kwargs)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def attach_db(conn: sqlite3.Connection, db_path: str, schema: str) -> None:
+    """ATTACHes `db_path` as `schema` and applies SCHEMA_PRAGMAS to it."""
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (db_path,))
+    for pragma in SCHEMA_PRAGMAS:
+        conn.execute(f"PRAGMA {schema}.{pragma}")
+
+def retry(exceptions, max_attempts: int = 5, base: float = 2, jitter: float = 0.5):
+    """Retries the wrapped call on `exceptions`, sleeping base**attempt plus random jitter between tries.
+
+    The last failure is re-raised so callers can decide what to keep.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_attempts):
+                try:
+                    return fn(*args, **kwargs)
+                except exceptions as e:
+                    if attempt == max_attempts - 1:
+                        raise
+                    delay = base ** attempt + random.uniform(0, jitter)
+                    logging.warning(f"{fn.__name__} failed ({e}); retry {attempt + 1}/{max_attempts - 1} in {delay:.1f}s")
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+class RateLimiter:
+    """Thread-safe token bucket: acquire() blocks until the next request fits under `qps`."""
+
+    def __init__(self, qps: float, burst: int = 1):
+        self.qps = qps
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.qps)
+            self.updated = now
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.qps)
+                self.tokens = 1.0
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+@functools.lru_cache(maxsize=None)
+def _insert_sql(verb: str, table: str, cols: tuple, row_count: int) -> str:
+    row_sql = "(" + ",".join("?" * len(cols)) + ")"
+    return f"{verb} INTO {table} ({', '.join(cols)}) VALUES " + ",".join([row_sql] * row_count)
+
+def multi_insert(cursor: sqlite3.Cursor, table: str, cols, rows, chunk: int = 100, verb: str = "INSERT OR IGNORE") -> None:
+    """Inserts `rows` `chunk` at a time with one multi-row VALUES statement per chunk.
+
+    Full chunks share one statement; the remainder goes through a single-row executemany.
+    Both SQL strings are built once per table, so sqlite3's statement cache reuses them.
+    """
+    cols = tuple(cols)
+    rows = list(rows)
+    full = len(rows) - len(rows) % chunk
+    if full:
+        chunk_sql = _insert_sql(verb, table, cols, chunk)
+        for start in range(0, full, chunk):
+            cursor.execute(chunk_sql, [x for row in rows[start:start + chunk] for x in row])
+    if full < len(rows):
+        cursor.executemany(_insert_sql(verb, table, cols, 1), rows[full:])